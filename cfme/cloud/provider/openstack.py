@@ -1,8 +1,51 @@
-from wrapanapi.openstack import OpenstackSystem
+from cached_property import cached_property
+from functools32 import lru_cache
 
 from . import CloudProvider
 from cfme.common.provider import EventsEndpoint
 from cfme.infrastructure.provider.openstack_infra import RHOSEndpoint, OpenStackInfraEndpointForm
+from utils import classproperty
+from utils.version import Version
+
+# Parsed once; 5.6 is where provider creation started requiring credential validation.
+_VALIDATION_VERSION = Version('5.6')
+
+
+@lru_cache(maxsize=None)
+def _requires_validation(appliance):
+    # appliance.version parses the build string every time it is compared,
+    # so remember the verdict per appliance.
+    return appliance.version >= _VALIDATION_VERSION
+
+
+# Parsed provider YAML keyed by prov_key. Only the config digestion is memoized;
+# from_config still builds fresh provider and endpoint objects on every call, so
+# tests mutating one instance cannot bleed into another. Safe as long as the
+# provider YAML is not mutated underneath us during a test run.
+_FROM_CONFIG_CACHE = {}
+
+# constructor kwarg -> (prov_config key, default) for the scalar from_config fields
+_CFG_MAP = (
+    ('name', 'name', None),
+    ('hostname', 'hostname', None),
+    ('ip_address', 'ipaddress', None),
+    ('api_port', 'port', None),
+    ('zone', 'server_zone', None),
+    ('sec_protocol', 'sec_protocol', 'Non-SSL'),
+    ('tenant_mapping', 'tenant_mapping', False),
+)
+
+_get_crud = None
+
+
+def _resolve_get_crud():
+    # utils.providers itself imports this module, hence the lazy one-shot binding
+    # instead of a plain top-level import.
+    global _get_crud
+    if _get_crud is None:
+        from utils.providers import get_crud
+        _get_crud = get_crud
+    return _get_crud
 
 
 class OpenStackProvider(CloudProvider):
@@ -11,10 +54,20 @@ class OpenStackProvider(CloudProvider):
      represents CFME provider and operations available in UI
     """
     type_name = "openstack"
-    mgmt_class = OpenstackSystem
     db_types = ["Openstack::CloudManager"]
     endpoints_form = OpenStackInfraEndpointForm
 
+    @classproperty
+    def mgmt_class(cls):
+        # wrapanapi.openstack drags in the whole OpenStack client stack, so the
+        # import is deferred until a management client is actually constructed
+        from wrapanapi.openstack import OpenstackSystem
+        return OpenstackSystem
+
+    # (id(appliance), infra provider key) pairs whose infra provider was already
+    # created+validated this session; lets several cloud providers share one infra create.
+    _created_infra = set()
+
     def __init__(self, name=None, endpoints=None, zone=None, key=None, hostname=None,
                  ip_address=None, api_port=None, sec_protocol=None, amqp_sec_protocol=None,
                  tenant_mapping=None, infra_provider=None, appliance=None):
@@ -30,15 +83,66 @@ class OpenStackProvider(CloudProvider):
 
     def create(self, *args, **kwargs):
         # Override the standard behaviour to actually create the underlying infra first.
+        force_infra = kwargs.pop('force_infra_create', False)
+        infra_key = None
+        skipped_infra = False
         if self.infra_provider:
-            self.infra_provider.create(validate_credentials=True, validate_inventory=True,
-                                       check_existing=True)
-        if self.appliance.version >= "5.6" and 'validate_credentials' not in kwargs:
+            infra_key = (id(self.appliance), self.infra_provider.key)
+            if force_infra or infra_key not in self._created_infra:
+                self._create_infra(infra_key)
+            else:
+                skipped_infra = True
+        if _requires_validation(self.appliance) and 'validate_credentials' not in kwargs:
             # 5.6 requires validation, so unless we specify, we want to validate
             kwargs['validate_credentials'] = True
-        return super(OpenStackProvider, self).create(*args, **kwargs)
+        try:
+            return super(OpenStackProvider, self).create(*args, **kwargs)
+        except Exception:
+            self._created_infra.discard(infra_key)
+            if not skipped_infra:
+                raise
+            # The recorded infra provider may have been deleted since (teardowns
+            # remove providers while the record persists for the session), so
+            # recreate it and give the cloud create one more try.
+            self._create_infra(infra_key)
+            return super(OpenStackProvider, self).create(*args, **kwargs)
+
+    def _create_infra(self, infra_key):
+        self.infra_provider.create(validate_credentials=True, validate_inventory=True,
+                                   check_existing=True)
+        self._created_infra.add(infra_key)
+
+    @property
+    def infra_provider(self):
+        return self._infra_provider
+
+    @infra_provider.setter
+    def infra_provider(self, value):
+        self._infra_provider = value
+        # the cached fill mapping embeds the infra provider name
+        self.__dict__.pop('view_value_mapping', None)
+
+    @property
+    def name(self):
+        return self._name
+
+    @name.setter
+    def name(self, value):
+        self._name = value
+        # update() renames providers in place, so the cached fill mapping
+        # has to go stale with the old name
+        self.__dict__.pop('view_value_mapping', None)
 
     @property
+    def tenant_mapping(self):
+        return self._tenant_mapping
+
+    @tenant_mapping.setter
+    def tenant_mapping(self, value):
+        self._tenant_mapping = value
+        self.__dict__.pop('view_value_mapping', None)
+
+    @cached_property
     def view_value_mapping(self):
         if self.infra_provider is None:
             # Don't look for the selectbox; it's either not there or we don't care what's selected
@@ -53,7 +157,7 @@ class OpenStackProvider(CloudProvider):
             'prov_type': 'OpenStack',
             'region': None,
             'infra_provider': infra_provider_name,
-            'tenant_mapping': getattr(self, 'tenant_mapping', None),
+            'tenant_mapping': self.tenant_mapping,
         }
 
     def deployment_helper(self, deploy_args):
@@ -62,26 +166,33 @@ class OpenStackProvider(CloudProvider):
             return {'network_name': self.data['network']}
         return {}
 
+    @classmethod
+    def clear_from_config_cache(cls):
+        """Drops the parsed from_config data, e.g. after reloading provider config."""
+        _FROM_CONFIG_CACHE.clear()
+
     @classmethod
     def from_config(cls, prov_config, prov_key, appliance=None):
-        endpoints = {}
-        endpoints[RHOSEndpoint.name] = RHOSEndpoint(**prov_config['endpoints'][RHOSEndpoint.name])
+        parsed = _FROM_CONFIG_CACHE.get(prov_key)
+        if parsed is None:
+            endpoints_cfg = prov_config['endpoints']
+            parsed = {
+                'rhos_cfg': endpoints_cfg[RHOSEndpoint.name],
+                'events_cfg': endpoints_cfg.get(EventsEndpoint.name),
+                'infra_prov_key': prov_config.get('infra_provider_key'),
+                'kwargs': {kwarg: prov_config.get(cfg_key, default)
+                           for kwarg, cfg_key, default in _CFG_MAP},
+            }
+            _FROM_CONFIG_CACHE[prov_key] = parsed
 
-        endp_name = EventsEndpoint.name
-        if prov_config['endpoints'].get(endp_name):
-            endpoints[endp_name] = EventsEndpoint(**prov_config['endpoints'][endp_name])
+        endpoints = {RHOSEndpoint.name: RHOSEndpoint(**parsed['rhos_cfg'])}
+        if parsed['events_cfg']:
+            endpoints[EventsEndpoint.name] = EventsEndpoint(**parsed['events_cfg'])
 
-        from utils.providers import get_crud
-        infra_prov_key = prov_config.get('infra_provider_key')
+        infra_prov_key = parsed['infra_prov_key']
+        get_crud = _resolve_get_crud()
         infra_provider = get_crud(infra_prov_key, appliance=appliance) if infra_prov_key else None
-        return cls(name=prov_config['name'],
-                   hostname=prov_config['hostname'],
-                   ip_address=prov_config['ipaddress'],
-                   api_port=prov_config['port'],
-                   endpoints=endpoints,
-                   zone=prov_config['server_zone'],
-                   key=prov_key,
-                   sec_protocol=prov_config.get('sec_protocol', "Non-SSL"),
-                   tenant_mapping=prov_config.get('tenant_mapping', False),
-                   infra_provider=infra_provider,
-                   appliance=appliance)
+        kwargs = dict(parsed['kwargs'])
+        kwargs.update(endpoints=endpoints, key=prov_key,
+                      infra_provider=infra_provider, appliance=appliance)
+        return cls(**kwargs)
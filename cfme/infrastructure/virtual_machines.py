@@ -2,14 +2,18 @@
 """A model of Infrastructure Virtual Machines area of CFME.  This includes the VMs explorer tree,
 quadicon lists, and VM details page.
 """
-from copy import copy
-from collections import namedtuple
-import fauxfactory
+import binascii
+import os
+from collections import Counter, namedtuple
 from functools import partial
+from functools32 import lru_cache
 import re
-from selenium.common.exceptions import NoSuchElementException
+import six
+import time
+from selenium.common.exceptions import NoSuchElementException, WebDriverException
 
 from navmazing import NavigateToSibling, NavigateToAttribute
+from sqlalchemy import and_, select
 
 from cfme.base.login import BaseLoggedInPage
 from cfme.common.vm import VM as BaseVM, Template as BaseTemplate, EditServerRelationShipView
@@ -84,17 +88,72 @@ retirement_date_form = Form(fields=[
 
 retire_remove_button = "//span[@id='remove_button']/a/img"
 
-match_page = partial(match_location, controller='vm_infra', title='Virtual Machines')
+_match_page = partial(match_location, controller='vm_infra', title='Virtual Machines')
+
+# Single-slot memo for match_page: chained navigators fire am_i_here checks
+# back to back, but every destination here lives under the same explorer URL,
+# so the verdict cannot be keyed on it. Instead the one most recent verdict is
+# kept briefly and dropped by every page-changing action in this module (the
+# navigator steps and reset_page), so it cannot leak across navigation steps.
+_MATCH_PAGE_TTL = 0.25
+_match_page_memo = [None, False, 0.0]  # summary, verdict, timestamp
+
+
+def _invalidate_match_page():
+    _match_page_memo[0] = None
+    _match_page_memo[2] = 0.0
+
+
+def match_page(summary=None):
+    now = time.time()
+    if _match_page_memo[0] == summary and now - _match_page_memo[2] < _MATCH_PAGE_TTL:
+        return _match_page_memo[1]
+    result = _match_page(summary=summary)
+    _match_page_memo[0] = summary
+    _match_page_memo[1] = result
+    _match_page_memo[2] = now
+    return result
+
+
 vm_templates_tree = partial(accordion.tree, "VMs & Templates")
 vms_tree = partial(accordion.tree, "VMs")
 templates_tree = partial(accordion.tree, "Templates")
 
 
+# Probes the page state needed by reset_page in one WebDriver round-trip instead of
+# a separate Selenium command per check. Visibility, not mere DOM presence, is
+# what the sel.is_displayed/page_controls_exist fallbacks test, so mirror that;
+# offsetParent is null for any element hidden via display:none or a hidden parent.
+_RESET_PAGE_PROBE_JS = """
+var visible = function (el) { return Boolean(el && el.offsetParent !== null); };
+var search = document.getElementById('search_text') ||
+             document.getElementsByName('search[text]')[0];
+return {
+    search_dirty: visible(search) && search.value.trim().length > 0,
+    paginator: visible(document.getElementById('masterToggle'))
+};
+"""
+
+
 def reset_page():
-    tb.select("Grid View")
-    if sel.is_displayed(search_box.search_field):
+    _invalidate_match_page()
+    # selecting an already-active view still clicks and waits for ajax,
+    # so only do it when another view is active
+    if not tb.is_active("Grid View"):
+        tb.select("Grid View")
+    try:
+        state = sel.execute_script(_RESET_PAGE_PROBE_JS)
+    except WebDriverException:
+        state = None
+    if state is None:
+        # Fall back to the probe-per-command path
+        state = {
+            'search_dirty': sel.is_displayed(search_box.search_field),
+            'paginator': paginator.page_controls_exist(),
+        }
+    if state['search_dirty']:
         search.ensure_normal_search_empty()
-    if paginator.page_controls_exist():
+    if state['paginator']:
         # paginator.results_per_page(1000)
         sel.check(paginator.check_all())
         sel.uncheck(paginator.check_all())
@@ -102,6 +161,60 @@ def reset_page():
 
 drift_table = CheckboxTable("//th[normalize-space(.)='Timestamp']/ancestor::table[1]")
 
+# Disk sizes are stored in bytes in the DB, but the UI default unit is GB;
+# multiplying by the reciprocal is a single float mul instead of an integer division
+_GB_PER_BYTE = 1.0 / (1024 ** 3)
+
+# Compiled once at import; some of these fire on every iteration of a wait_for poll
+_ACTIVE_SNAPSHOT_RE = re.compile(r"\s*\(Active\)$")
+_SELECTED_NODE_RE = re.compile(r"^.*?\(Selected\)$")
+
+_ACTIVE_SNAPSHOT_LOC = ("//a[contains(normalize-space(.), '(Active)')]|"
+                        "//li[contains(normalize-space(.), '(Active)')]")
+_SNAPSHOT_DESCRIPTION_LOC = "|".join([
+    # Newer
+    "//label[normalize-space(.)='Description']/../div/p",
+    # Older
+    "//td[@class='key' and normalize-space(.)='Description']/.."
+    "/td[not(contains(@class, 'key'))]"])
+
+SnapshotSummary = namedtuple('SnapshotSummary', ['total', 'name', 'description'])
+
+
+@lru_cache(maxsize=None)
+def _provisioning_data(provider_key):
+    """Provisioning section of cfme_data for the given provider, memoized
+
+    cfme_data is immutable at runtime, so the nested lookup (and its exception
+    guard) only needs to run once per provider key.
+    """
+    try:
+        return cfme_data["management_systems"][provider_key]["provisioning"]
+    except (KeyError, IndexError):
+        raise ValueError("You have to specify the correct options in cfme_data.yaml")
+
+
+def _rand_name():
+    """Cheap 10-char alphanumeric string for generated provisioning names/emails
+
+    os.urandom + hexlify is an order of magnitude faster than fauxfactory's
+    per-character RNG walk, which shows up in provisioning-heavy test sweeps.
+    """
+    return binascii.hexlify(os.urandom(5)).decode('ascii')
+
+
+_provisioning_form = None
+
+
+def _get_provisioning_form():
+    # cfme.provisioning imports this module, so the reference has to be resolved
+    # lazily - but only once per process instead of on every form fill.
+    global _provisioning_form
+    if _provisioning_form is None:
+        from cfme.provisioning import provisioning_form
+        _provisioning_form = provisioning_form
+    return _provisioning_form
+
 
 class InfraVmDetailsView(BaseLoggedInPage):
     # TODO this is only minimal implementation for toolbar access through widgetastic
@@ -145,6 +258,68 @@ class InfraVmReconfigureView(BaseLoggedInPage):
     # The page doesn't contain enough info to ensure that it's the right VM -> always navigate
     is_displayed = False
 
+    # Fills and confirms a freshly added disk row in one WebDriver round-trip instead
+    # of one per widget; values go to the underlying inputs with change events
+    # dispatched so the page's model picks them up.
+    _ADD_DISK_ROW_JS = """
+        var type = arguments[0], mode = arguments[1], unit = arguments[2],
+            size = arguments[3], dependent = arguments[4];
+        var row = document.getElementById('hdType');
+        while (row !== null && row.tagName !== 'TR') { row = row.parentNode; }
+        if (row === null) { return false; }
+        function fireChange(el) {
+            var ev = document.createEvent('HTMLEvents');
+            ev.initEvent('change', true, false);
+            el.dispatchEvent(ev);
+        }
+        function setSelect(id, value) {
+            var el = row.querySelector('select#' + id);
+            if (el === null) { return false; }
+            for (var i = 0; i < el.options.length; i++) {
+                var opt = el.options[i];
+                if (opt.value === String(value) || opt.text.trim() === String(value)) {
+                    el.selectedIndex = i;
+                    fireChange(el);
+                    return true;
+                }
+            }
+            return false;
+        }
+        // Unit must go in before size, otherwise the page recalculates the size
+        if (!setSelect('hdType', type) || !setSelect('hdMode', mode) ||
+                !setSelect('hdUnit', unit)) { return false; }
+        var sizeEl = row.querySelector('input#dvcSize');
+        if (sizeEl === null) { return false; }
+        sizeEl.value = size;
+        fireChange(sizeEl);
+        var dep = row.querySelector('input[name="cb_dependent"]');
+        if (dep === null) { return false; }
+        if (dep.checked !== dependent) { dep.click(); }
+        // The select cells render bootstrap-select dropdown toggles, which are
+        // also buttons - the confirm button is the one in the Actions cell
+        var cells = row.cells;
+        var confirm = cells[cells.length - 1].querySelector('button');
+        if (confirm === null) { return false; }
+        confirm.click();
+        // Driving the native selects directly bypasses the bootstrap-select
+        // machinery, so only report success once the editable widgets are gone,
+        // i.e. the row was actually committed
+        return document.getElementById('hdType') === null;
+    """
+
+    def add_disk_scripted(self, type, mode, size_unit, size, dependent):
+        """Fills the just-added disk row and confirms it with a single JS call
+
+        Returns ``True`` on success, ``False`` when the expected elements could not
+        be driven by the script - the caller should then fall back to per-widget
+        fills.
+        """
+        try:
+            return bool(self.browser.execute_script(
+                self._ADD_DISK_ROW_JS, type, mode, size_unit, size, dependent))
+        except WebDriverException:
+            return False
+
 
 class VMDisk(
         namedtuple('VMDisk', ['filename', 'size', 'size_unit', 'type', 'mode'])):
@@ -153,17 +328,19 @@ class VMDisk(
     Note:
         Cannot be changed once created.
     """
-    EQUAL_ATTRS = {'type', 'mode', 'size_mb'}
-
     def __eq__(self, other):
         # If both have filename, it's easy
         if self.filename and other.filename:
             return self.filename == other.filename
-        # If one of filenames is None (before disk is created), compare the rest
-        for attr in self.EQUAL_ATTRS:
-            if getattr(self, attr) != getattr(other, attr):
-                return False
-        return True
+        # If one of filenames is None (before disk is created), compare the rest;
+        # a single tuple compare instead of a getattr loop
+        return ((self.size_mb, self.type, self.mode) ==
+                (other.size_mb, other.type, other.mode))
+
+    def __hash__(self):
+        # Deliberately excludes filename so that a not-yet-created disk (filename None)
+        # hashes together with the DB disk it will become, consistently with __eq__.
+        return hash((self.size_mb, self.type, self.mode))
 
     @property
     def size_mb(self):
@@ -172,8 +349,10 @@ class VMDisk(
 
 class VMHardware(object):
     """Represents VM's hardware, i.e. CPU (cores, sockets) and memory
+
+    Slotted because genealogy/batch operations create these by the thousand.
     """
-    EQUAL_ATTRS = {'cores_per_socket', 'sockets', 'mem_size_mb'}
+    __slots__ = ('cores_per_socket', 'sockets', 'mem_size', 'mem_size_unit')
 
     def __init__(self, cores_per_socket=None, sockets=None, mem_size=None, mem_size_unit='MB'):
         self.cores_per_socket = cores_per_socket
@@ -182,10 +361,8 @@ class VMHardware(object):
         self.mem_size_unit = mem_size_unit
 
     def __eq__(self, other):
-        for attr in self.EQUAL_ATTRS:
-            if getattr(self, attr) != getattr(other, attr):
-                return False
-        return True
+        return ((self.cores_per_socket, self.sockets, self.mem_size_mb) ==
+                (other.cores_per_socket, other.sockets, other.mem_size_mb))
 
     @property
     def mem_size_mb(self):
@@ -216,46 +393,61 @@ class VMConfiguration(Pretty):
 
     def _load(self):
         """Loads the configuration from the VM object's appliance (through DB)
+
+        Hardware and disks come back in a single Core round-trip; ORM hydration of the
+        four mapped entities would be pure overhead for the handful of scalars we read.
+
+        The first load has to resolve the VM by provider/VM name; the VM's DB id is
+        cached afterwards so reloads (e.g. after a reconfigure) filter hardwares by
+        integer primary key and skip the ext_management_systems/vms joins entirely.
         """
         appl_db = self.vm.appliance.db.client
 
-        # Hardware
-        ems = appl_db['ext_management_systems']
-        vms = appl_db['vms']
-        hws = appl_db['hardwares']
-        hw_data = appl_db.session.query(ems, vms, hws).filter(
-            ems.name == self.vm.provider.name).filter(
-            vms.ems_id == ems.id).filter(
-            vms.name == self.vm.name).filter(
-            hws.vm_or_template_id == vms.id
-        ).first().hardwares
+        hws = appl_db['hardwares'].__table__
+        disks = appl_db['disks'].__table__
+        hw_columns = [hws.c.cpu_cores_per_socket, hws.c.cpu_sockets, hws.c.memory_mb,
+                      disks.c.id.label('disk_id'), disks.c.filename, disks.c.size,
+                      disks.c.disk_type, disks.c.mode]
+        disks_onclause = and_(disks.c.hardware_id == hws.c.id,
+                              disks.c.device_type == 'disk')
+
+        vm_id = self.vm._db_id
+        if vm_id is not None:
+            stmt = select(hw_columns).select_from(
+                hws.outerjoin(disks, disks_onclause)
+            ).where(hws.c.vm_or_template_id == vm_id)
+        else:
+            ems = appl_db['ext_management_systems'].__table__
+            vms = appl_db['vms'].__table__
+            stmt = select(
+                hw_columns + [vms.c.id.label('vm_id')]
+            ).select_from(
+                ems.join(vms, vms.c.ems_id == ems.c.id)
+                   .join(hws, hws.c.vm_or_template_id == vms.c.id)
+                   .outerjoin(disks, disks_onclause)
+            ).where(and_(ems.c.name == self.vm.provider.name, vms.c.name == self.vm.name))
+        rows = appl_db.engine.execute(stmt).fetchall()
+
+        hw_row = rows[0]
+        if vm_id is None:
+            self.vm._db_id = hw_row.vm_id
         self.hw = VMHardware(
-            hw_data.cpu_cores_per_socket, hw_data.cpu_sockets, hw_data.memory_mb, 'MB')
-        hw_id = hw_data.id
-
-        # Disks
-        disks = appl_db['disks']
-        disks_data = appl_db.session.query(disks).filter(
-            disks.hardware_id == hw_id).filter(
-            disks.device_type == 'disk'
-        ).all()
-        for disk_data in disks_data:
-            # In DB stored in bytes, but UI default is GB
-            size_gb = disk_data.size / (1024 ** 3)
-            self.disks.append(
-                VMDisk(
-                    filename=disk_data.filename,
-                    size=size_gb,
-                    size_unit='GB',
-                    type=disk_data.disk_type,
-                    mode=disk_data.mode
-                ))
+            hw_row.cpu_cores_per_socket, hw_row.cpu_sockets, hw_row.memory_mb, 'MB')
+
+        # The outer join pads disk-less hardware with a NULL disk id; a real disk
+        # row may legitimately have a NULL filename, so key the check on the id
+        self.disks = [
+            VMDisk(filename=row.filename, size=int(row.size * _GB_PER_BYTE), size_unit='GB',
+                   type=row.disk_type, mode=row.mode)
+            for row in rows if row.disk_id is not None]
 
     def copy(self):
         """Returns a copy of this configuration
         """
         config = VMConfiguration.__new__(VMConfiguration)
-        config.hw = copy(self.hw)
+        # Direct construction is cheaper than copy.copy's __reduce_ex__ walk
+        config.hw = VMHardware(
+            self.hw.cores_per_socket, self.hw.sockets, self.hw.mem_size, self.hw.mem_size_unit)
         # We can just make shallow copy here because disks can be only added or deleted, not edited
         config.disks = self.disks[:]
         config.vm = self.vm
@@ -287,7 +479,9 @@ class VMConfiguration(Pretty):
     def delete_disk(self, filename=None, index=None):
         """Removes a disk of given filename or index"""
         if filename:
-            disk = [disk for disk in self.disks if disk.filename == filename][0]
+            disk = next((disk for disk in self.disks if disk.filename == filename), None)
+            if disk is None:
+                raise KeyError("No disk with filename {} to delete".format(filename))
             self.disks.remove(disk)
         elif index:
             del self.disks[index]
@@ -306,19 +500,28 @@ class VMConfiguration(Pretty):
         """
         changes = {}
         changes['disks'] = []
+        self_hw, other_hw = self.hw, other_configuration.hw
         for key in ['cores_per_socket', 'sockets']:
-            if getattr(self.hw, key) != getattr(other_configuration.hw, key):
-                changes[key] = str(getattr(other_configuration.hw, key))
+            other_value = getattr(other_hw, key)
+            if getattr(self_hw, key) != other_value:
+                changes[key] = str(other_value)
                 changes['cpu'] = True
-        if self.hw.mem_size != other_configuration.hw.mem_size \
-                or self.hw.mem_size_unit != other_configuration.hw.mem_size_unit:
+        if self_hw.mem_size != other_hw.mem_size \
+                or self_hw.mem_size_unit != other_hw.mem_size_unit:
             changes['memory'] = True
-            changes['mem_size'] = other_configuration.hw.mem_size
-            changes['mem_size_unit'] = other_configuration.hw.mem_size_unit
-        for disk in self.disks + other_configuration.disks:
-            if disk in self.disks and disk not in other_configuration.disks:
+            changes['mem_size'] = other_hw.mem_size
+            changes['mem_size_unit'] = other_hw.mem_size_unit
+        # Counter rather than set: several pending adds share filename=None and
+        # compare equal, and a plain set diff would collapse them into one entry
+        unmatched = Counter(other_configuration.disks)
+        for disk in self.disks:
+            if unmatched[disk]:
+                unmatched[disk] -= 1
+            else:
                 changes['disks'].append({'action': 'delete', 'disk': disk, 'delete_backing': None})
-            elif disk not in self.disks and disk in other_configuration.disks:
+        for disk in other_configuration.disks:
+            if unmatched[disk]:
+                unmatched[disk] -= 1
                 changes['disks'].append({'action': 'add', 'disk': disk})
         return changes
 
@@ -331,6 +534,8 @@ class Vm(BaseVM):
         provider_crud: :py:class:`cfme.cloud.provider.Provider` object
         template_name: Name of the template to use for provisioning
     """
+    # DB primary key of this VM's vms row, resolved lazily by VMConfiguration._load
+    _db_id = None
 
     class Snapshot(object):
         snapshot_tree = deferred_verpick({
@@ -343,8 +548,15 @@ class Vm(BaseVM):
             self.description = description
             self.memory = memory
             self.vm = parent_vm
+            # Precompiled for the tree lookups below; escaping also stops names with
+            # regex metacharacters from miscompiling.
+            self._name_re = re.compile(re.escape(name) + r".*?") if name is not None else None
+            self._description_re = (
+                re.compile(re.escape(description) + r".*?") if description is not None else None)
 
         def _nav_to_snapshot_mgmt(self):
+            # summary_title is a single round-trip and, unlike any python-side
+            # flag, cannot go stale when something else moves the browser
             snapshot_title = '"Snapshots" for Virtual Machine "{}"'.format(self.vm.name)
             if summary_title() != snapshot_title:
                 self.vm.load_details()
@@ -354,9 +566,9 @@ class Vm(BaseVM):
             self._nav_to_snapshot_mgmt()
             try:
                 if self.name is not None:
-                    self.snapshot_tree.find_path_to(re.compile(self.name + r".*?"))
+                    self.snapshot_tree.find_path_to(self._name_re)
                 else:
-                    self.snapshot_tree.find_path_to(re.compile(self.description + r".*?"))
+                    self.snapshot_tree.find_path_to(self._description_re)
                 return True
             except CandidateNotFound:
                 return False
@@ -367,7 +579,7 @@ class Vm(BaseVM):
             self._nav_to_snapshot_mgmt()
             try:
                 self.snapshot_tree.click_path(
-                    *self.snapshot_tree.find_path_to(re.compile(self.name)))
+                    *self.snapshot_tree.find_path_to(self._name_re))
                 if sel.is_displayed_text(self.name + " (Active)"):
                     return True
             except CandidateNotFound:
@@ -408,7 +620,7 @@ class Vm(BaseVM):
 
         def revert_to(self, cancel=False):
             self._nav_to_snapshot_mgmt()
-            self.snapshot_tree.click_path(*self.snapshot_tree.find_path_to(re.compile(self.name)))
+            self.snapshot_tree.click_path(*self.snapshot_tree.find_path_to(self._name_re))
             toolbar.select('Revert to selected snapshot', invokes_alert=True)
             sel.handle_alert(cancel=cancel)
             flash.assert_message_match('Revert To Snapshot initiated for 1 VM and Instance from '
@@ -454,13 +666,10 @@ class Vm(BaseVM):
     def migrate_vm(self, email=None, first_name=None, last_name=None,
                    host_name=None, datastore_name=None):
         navigate_to(self, 'Migrate')
-        first_name = first_name or fauxfactory.gen_alphanumeric()
-        last_name = last_name or fauxfactory.gen_alphanumeric()
+        first_name = first_name or _rand_name()
+        last_name = last_name or _rand_name()
         email = email or "{}@{}.test".format(first_name, last_name)
-        try:
-            prov_data = cfme_data["management_systems"][self.provider.key]["provisioning"]
-        except (KeyError, IndexError):
-            raise ValueError("You have to specify the correct options in cfme_data.yaml")
+        prov_data = _provisioning_data(self.provider.key)
         provisioning_data = {
             "first_name": first_name,
             "last_name": last_name,
@@ -469,19 +678,16 @@ class Vm(BaseVM):
         }
         if not self.provider.one_of(RHEVMProvider):
             provisioning_data["datastore_name"] = {"name": prov_data.get("datastore")}
-        from cfme.provisioning import provisioning_form
+        provisioning_form = _get_provisioning_form()
         fill(provisioning_form, provisioning_data, action=provisioning_form.submit_button)
 
     def clone_vm(self, email=None, first_name=None, last_name=None,
                  vm_name=None, provision_type=None):
         navigate_to(self, 'Clone')
-        first_name = first_name or fauxfactory.gen_alphanumeric()
-        last_name = last_name or fauxfactory.gen_alphanumeric()
+        first_name = first_name or _rand_name()
+        last_name = last_name or _rand_name()
         email = email or "{}@{}.test".format(first_name, last_name)
-        try:
-            prov_data = cfme_data["management_systems"][self.provider.key]["provisioning"]
-        except (KeyError, IndexError):
-            raise ValueError("You have to specify the correct options in cfme_data.yaml")
+        prov_data = _provisioning_data(self.provider.key)
         provisioning_data = {
             "first_name": first_name,
             "last_name": last_name,
@@ -492,19 +698,16 @@ class Vm(BaseVM):
             "datastore_name": {"name": prov_data.get("datastore")},
             "vlan": prov_data.get("vlan")
         }
-        from cfme.provisioning import provisioning_form
+        provisioning_form = _get_provisioning_form()
         fill(provisioning_form, provisioning_data, action=provisioning_form.submit_button)
 
     def publish_to_template(self, template_name, email=None, first_name=None, last_name=None):
         self.load_details()
         lcl_btn("Publish this VM to a Template")
-        first_name = first_name or fauxfactory.gen_alphanumeric()
-        last_name = last_name or fauxfactory.gen_alphanumeric()
+        first_name = first_name or _rand_name()
+        last_name = last_name or _rand_name()
         email = email or "{}@{}.test".format(first_name, last_name)
-        try:
-            prov_data = cfme_data["management_systems"][self.provider.key]["provisioning"]
-        except (KeyError, IndexError):
-            raise ValueError("You have to specify the correct options in cfme_data.yaml")
+        prov_data = _provisioning_data(self.provider.key)
 
         provisioning_data = {
             "first_name": first_name,
@@ -514,16 +717,45 @@ class Vm(BaseVM):
             "host_name": {"name": prov_data.get("host")},
             "datastore_name": {"name": prov_data.get("datastore")},
         }
-        from cfme.provisioning import provisioning_form
+        provisioning_form = _get_provisioning_form()
         fill(provisioning_form, provisioning_data, action=provisioning_form.submit_button)
         cells = {'Description': 'Publish from [{}] to [{}]'.format(self.name, template_name)}
         row, __ = wait_for(
             requests.wait_for_request, [cells], fail_func=requests.reload, num_sec=900, delay=20)
         return Template(template_name, self.provider)
 
+    def snapshot_summary(self):
+        """Returns snapshot count plus current snapshot name and description in one pass
+
+        Reading :py:attr:`current_snapshot_name` and
+        :py:attr:`current_snapshot_description` individually costs one details page
+        load each; this scrapes both, plus the count, after a single load. Use
+        :py:attr:`total_snapshots` when only the count is needed - it stays on the
+        details page.
+
+        Returns: :py:class:`SnapshotSummary` namedtuple (``name``/``description`` are
+            ``None`` when the VM has no snapshots).
+        """
+        self.load_details(refresh=True)
+        snapshots = InfoBlock.text("Properties", "Snapshots").strip().lower()
+        total = 0 if snapshots == "none" else int(snapshots)
+        if not total:
+            return SnapshotSummary(total=0, name=None, description=None)
+        sel.click(InfoBlock("Properties", "Snapshots"))
+        text = sel.text(_ACTIVE_SNAPSHOT_LOC).strip()
+        # In 5.6 the locator returns the entire tree string, snapshot name is after a newline
+        name = _ACTIVE_SNAPSHOT_RE.sub("", text.split('\n')[-1:][0])
+        description = sel.text(_SNAPSHOT_DESCRIPTION_LOC).strip()
+        return SnapshotSummary(total=total, name=name, description=description)
+
     @property
     def total_snapshots(self):
-        """Returns the number of snapshots for this VM. If it says ``None``, returns ``0``."""
+        """Returns the number of snapshots for this VM. If it says ``None``, returns ``0``.
+
+        Kept as a plain summary-table read; wait_for loops poll this, so it must
+        stay cheap and must not click into the snapshot page the way
+        :py:meth:`snapshot_summary` does.
+        """
         snapshots = self.get_detail(properties=("Properties", "Snapshots")).strip().lower()
         if snapshots == "none":
             return 0
@@ -533,25 +765,12 @@ class Vm(BaseVM):
     @property
     def current_snapshot_name(self):
         """Returns the current snapshot name."""
-        self.load_details(refresh=True)
-        sel.click(InfoBlock("Properties", "Snapshots"))
-        text = sel.text("//a[contains(normalize-space(.), '(Active)')]|"
-            "//li[contains(normalize-space(.), '(Active)')]").strip()
-        # In 5.6 the locator returns the entire tree string, snapshot name is after a newline
-        return re.sub(r"\s*\(Active\)$", "", text.split('\n')[-1:][0])
+        return self.snapshot_summary().name
 
     @property
     def current_snapshot_description(self):
         """Returns the current snapshot description."""
-        self.load_details(refresh=True)
-        sel.click(InfoBlock("Properties", "Snapshots"))
-        l = "|".join([
-            # Newer
-            "//label[normalize-space(.)='Description']/../div/p",
-            # Older
-            "//td[@class='key' and normalize-space(.)='Description']/.."
-            "/td[not(contains(@class, 'key'))]"])
-        return sel.text(l).strip()
+        return self.snapshot_summary().description
 
     @property
     def genealogy(self):
@@ -560,6 +779,25 @@ class Vm(BaseVM):
     def get_vm_via_rest(self):
         return self.appliance.rest_api.collections.vms.get(name=self.name)
 
+    @classmethod
+    def get_many_via_rest(cls, appliance, names):
+        """Fetches REST entities for several VMs with a single request
+
+        Same-attribute filters are OR'd by the API, so the whole batch costs one
+        HTTP round-trip instead of one per name.
+
+        Args:
+            appliance: Appliance whose REST API to query
+            names: Iterable of VM names
+
+        Returns: dict of name -> REST entity; names unknown to the appliance are
+            simply absent from the result.
+        """
+        resources = appliance.rest_api.collections.vms.query_string(
+            expand='resources',
+            **{'filter[]': ['name={}'.format(name) for name in names]})
+        return {resource.name: resource for resource in resources}
+
     def get_collection_via_rest(self):
         return self.appliance.rest_api.collections.vms
 
@@ -607,9 +845,22 @@ class Vm(BaseVM):
                     "Save Changes", dimmed_alt="Save", force_click=True))
                 flash.assert_success_message("Management Engine Relationship saved")
 
+    _cached_configuration = None
+
     @property
     def configuration(self):
-        return VMConfiguration(self)
+        """Current :py:class:`VMConfiguration`, loaded from the DB once and cached.
+
+        The cache is dropped automatically when a reconfigure request is submitted;
+        use :py:meth:`refresh_configuration` to force a reload at any other time.
+        """
+        if self._cached_configuration is None:
+            self._cached_configuration = VMConfiguration(self)
+        return self._cached_configuration
+
+    def refresh_configuration(self):
+        """Drops the cached configuration so the next access reloads it from the DB"""
+        self._cached_configuration = None
 
     def reconfigure(self, new_configuration=None, changes=None, cancel=False):
         """Reconfigures the VM based on given configuration or set of changes
@@ -627,14 +878,20 @@ class Vm(BaseVM):
         if new_configuration:
             changes = self.configuration.get_changes_to_fill(new_configuration)
 
-        any_changes = any(v not in [None, []] for v in changes.values())
+        # One pass both detects whether there is anything to change and collects
+        # the form-fill values; disks gotta be added separately below.
+        fill_data = {}
+        any_changes = False
+        for key, value in changes.items():
+            if value is None or value == []:
+                continue
+            any_changes = True
+            if key != 'disks':
+                fill_data[key] = value
         if not any_changes and not cancel:
             raise ValueError("No changes specified - cannot reconfigure VM.")
 
         vm_recfg = navigate_to(self, 'Reconfigure')
-
-        # We gotta add disks separately
-        fill_data = {k: v for k, v in changes.iteritems() if k != 'disks'}
         vm_recfg.fill(fill_data)
 
         for disk_change in changes['disks']:
@@ -647,14 +904,18 @@ class Vm(BaseVM):
                 else:
                     mode = disk.mode
                     dependent = True
-                row = vm_recfg.disks_table.click_add_disk()
-                row.type.fill(disk.type)
-                row.mode.fill(mode)
-                # Unit first, then size (otherwise JS would try to recalculate the size...)
-                row[4].fill(disk.size_unit)
-                row.size.fill(disk.size)
-                row.dependent.fill(dependent)
-                row.actions.widget.click()
+                vm_recfg.disks_table.add_disk_btn.click()
+                if not vm_recfg.add_disk_scripted(
+                        disk.type, mode, disk.size_unit, disk.size, dependent):
+                    # Scripted fill didn't take; drive the widgets one by one
+                    row = vm_recfg.disks_table[0]
+                    row.type.fill(disk.type)
+                    row.mode.fill(mode)
+                    # Unit first, then size (otherwise JS would try to recalculate the size...)
+                    row[4].fill(disk.size_unit)
+                    row.size.fill(disk.size)
+                    row.dependent.fill(dependent)
+                    row.actions.widget.click()
             elif action == 'delete':
                 row = vm_recfg.disks_table.row(name=disk.filename)
                 row.delete_backing.fill(disk_change['delete_backing'])
@@ -672,6 +933,8 @@ class Vm(BaseVM):
             # TODO Cannot use Requests view for flash messages here because we don't have one yet
             vm_recfg.flash.assert_no_error()
             vm_recfg.flash.assert_message("VM Reconfigure Request was saved")
+        # The DB-backed configuration is (going to be) stale now
+        self.refresh_configuration()
 
         # TODO This should (one day) return a VM reconfigure request obj that we can further use
 
@@ -731,7 +994,7 @@ class Genealogy(object):
         attributes = kwargs.get("attributes", "all").lower()
         mode = kwargs.get("mode", "exists").lower()
         assert len(objects) >= 2, "You must specify at least two objects"
-        objects = map(lambda o: o.name if isinstance(o, (Vm, Template)) else o, objects)
+        objects = [o.name if isinstance(o, (Vm, Template)) else o for o in objects]
         self.navigate()
         for obj in objects:
             if not isinstance(obj, list):
@@ -741,7 +1004,8 @@ class Genealogy(object):
         # COMPARE PAGE
         flash.assert_no_errors()
         if sections is not None:
-            map(lambda path: self.section_comparison_tree.check_node(*path), sections)
+            for path in sections:
+                self.section_comparison_tree.check_node(*path)
             sel.click(self.apply_button)
             flash.assert_no_errors()
         # Set requested attributes sets
@@ -759,24 +1023,35 @@ class Genealogy(object):
     def ancestors(self):
         """Returns list of ancestors of the represented object."""
         self.navigate()
-        path = self.genealogy_tree.find_path_to(re.compile(r"^.*?\(Selected\)$"))
+        path = self.genealogy_tree.find_path_to(_SELECTED_NODE_RE)
         if not path:
             raise ValueError("Something wrong happened, path not found!")
         processed_path = []
         for step in path[:-1]:
             # We will remove the (parent) and (Selected) suffixes
-            processed_path.append(re.sub(r"\s*(?:\(Current\)|\(Parent\))$", "", step))
+            if step.endswith(' (Current)'):
+                processed_path.append(step[:-10])
+            elif step.endswith(' (Parent)'):
+                processed_path.append(step[:-9])
+            else:
+                processed_path.append(step)
         return processed_path
 
 
 ###
 # Multi-object functions
 #
+@lru_cache(maxsize=512)
+def _quad(vm_name):
+    """Quadicons are just locator holders, so share one per VM name"""
+    return Quadicon(vm_name, 'vm')
+
+
 # todo: to check and probably remove this function. it might be better off refactoring whole file
 def _method_setup(vm_names, provider_crud=None):
     """ Reduces some redundant code shared between methods """
-    if isinstance(vm_names, basestring):
-        vm_names = [vm_names]
+    if isinstance(vm_names, six.string_types):
+        vm_names = (vm_names,)
 
     if provider_crud:
         provider_crud.load_all_provider_vms()
@@ -784,8 +1059,11 @@ def _method_setup(vm_names, provider_crud=None):
         navigate_to(Vm, 'VMsOnly')
     if paginator.page_controls_exist():
         paginator.results_per_page(1000)
+    # local refs; the loop runs once per selected VM on up-to-1000-item pages
+    _check = sel.check
+    quad = _quad
     for vm_name in vm_names:
-        sel.check(Quadicon(vm_name, 'vm').checkbox())
+        _check(quad(vm_name).checkbox())
 
 
 def find_quadicon(vm_name, do_not_navigate=False):
@@ -801,8 +1079,8 @@ def find_quadicon(vm_name, do_not_navigate=False):
         raise VmNotFound("VM '{}' not found in UI!".format(vm_name))
 
     paginator.results_per_page(1000)
+    quadicon = _quad(vm_name)
     for page in paginator.pages():
-        quadicon = Quadicon(vm_name, "vm")
         if sel.is_displayed(quadicon):
             return quadicon
     else:
@@ -833,15 +1111,44 @@ def wait_for_vm_state_change(vm_name, desired_state, timeout=300, provider_crud=
         timeout: Specify amount of time (in seconds) to wait until TimedOutError is raised
         provider_crud: provider object where vm resides on (optional)
     """
+    _method_setup(vm_name, provider_crud)
+    # find the quadicon once; state is re-read from the DOM on every tick
+    quadicon = find_quadicon(vm_name, do_not_navigate=True)
+    desired_token = 'currentstate-' + desired_state
+    # targeted locator for the state quadrant already showing the desired
+    # state; one is_displayed call instead of parsing the image url out
+    quadrant = quadicon._locate_quadrant('b')
+    desired_loc = ('{0}//img[contains(@src, "{1}")]|'
+                   '{0}//div[contains(@style, "{1}")]'.format(quadrant, desired_token))
+
     def _looking_for_state_change():
         toolbar.refresh()
-        return 'currentstate-' + desired_state in find_quadicon(
-            vm_name, do_not_navigate=False).state
+        try:
+            return sel.is_displayed(desired_loc)
+        except WebDriverException:
+            # locator miss (UI change?); fall back to the full state parse
+            return desired_token in quadicon.state
 
-    _method_setup(vm_name, provider_crud)
     return wait_for(_looking_for_state_change, num_sec=timeout)
 
 
+def _is_pwr_option_visible_no_setup(option):
+    # toolbar-only check; assumes the VMs are already selected
+    try:
+        toolbar.is_greyed('Power', option)
+        return True
+    except NoSuchElementException:
+        return False
+
+
+def _is_pwr_option_enabled_no_setup(option):
+    # toolbar-only check; assumes the VMs are already selected
+    try:
+        return not toolbar.is_greyed('Power', option)
+    except NoSuchElementException:
+        raise OptionNotAvailable("No such power option (" + str(option) + ") is available")
+
+
 def is_pwr_option_visible(vm_names, option, provider_crud=None):
     """Returns whether a particular power option is visible.
 
@@ -852,11 +1159,7 @@ def is_pwr_option_visible(vm_names, option, provider_crud=None):
         provider_crud: provider object where vm resides on (optional)
     """
     _method_setup(vm_names, provider_crud)
-    try:
-        toolbar.is_greyed('Power', option)
-        return True
-    except NoSuchElementException:
-        return False
+    return _is_pwr_option_visible_no_setup(option)
 
 
 def is_pwr_option_enabled(vm_names, option, provider_crud=None):
@@ -872,10 +1175,7 @@ def is_pwr_option_enabled(vm_names, option, provider_crud=None):
             When unable to find the power option passed
     """
     _method_setup(vm_names, provider_crud)
-    try:
-        return not toolbar.is_greyed('Power', option)
-    except NoSuchElementException:
-        raise OptionNotAvailable("No such power option (" + str(option) + ") is available")
+    return _is_pwr_option_enabled_no_setup(option)
 
 
 def do_power_control(vm_names, option, provider_crud=None, cancel=True):
@@ -889,10 +1189,12 @@ def do_power_control(vm_names, option, provider_crud=None, cancel=True):
     """
     _method_setup(vm_names, provider_crud)
 
-    if (is_pwr_option_visible(vm_names, provider_crud=provider_crud, option=option) and
-            is_pwr_option_enabled(vm_names, provider_crud=provider_crud, option=option)):
-                pwr_btn(option, invokes_alert=True)
-                sel.handle_alert(cancel=cancel)
+    # the VMs stay selected, so checking the toolbar directly avoids
+    # re-navigating and re-selecting everything twice more
+    if (_is_pwr_option_visible_no_setup(option) and
+            _is_pwr_option_enabled_no_setup(option)):
+        pwr_btn(option, invokes_alert=True)
+        sel.handle_alert(cancel=cancel)
 
 
 def perform_smartstate_analysis(vm_names, provider_crud=None, cancel=True):
@@ -908,11 +1210,20 @@ def perform_smartstate_analysis(vm_names, provider_crud=None, cancel=True):
     sel.handle_alert(cancel=cancel)
 
 
-def get_all_vms(do_not_navigate=False):
-    """Returns list of all vms"""
+def iter_all_vms(do_not_navigate=False):
+    """Yields vm names page by page, so callers can stop early"""
     if not do_not_navigate:
         navigate_to(Vm, 'VMsOnly')
-    return [q.name for q in Quadicon.all("vm")]
+    if not paginator.page_controls_exist():
+        # empty list; don't make Quadicon.all walk a page with no quads
+        return
+    for quadicon in Quadicon.all("vm"):
+        yield quadicon.name
+
+
+def get_all_vms(do_not_navigate=False):
+    """Returns list of all vms"""
+    return list(iter_all_vms(do_not_navigate=do_not_navigate))
 
 
 def get_number_of_vms(do_not_navigate=False):
@@ -937,6 +1248,7 @@ class VmAllWithTemplates(CFMENavigateStep):
     prerequisite = NavigateToAttribute('appliance.server', 'LoggedIn')
 
     def step(self, *args, **kwargs):
+        _invalidate_match_page()
         self.prerequisite_view.navigation.select('Compute', 'Infrastructure', '/vm_infra/explorer')
         accordion.tree('VMs & Templates', 'All VMs & Templates')
 
@@ -953,6 +1265,7 @@ class VmAllWithTemplatesForProvider(CFMENavigateStep):
     prerequisite = NavigateToSibling('All')
 
     def step(self, *args, **kwargs):
+        _invalidate_match_page()
         if 'provider' in kwargs:
             provider = kwargs['provider'].name
         elif self.obj.provider:
@@ -980,6 +1293,7 @@ class VmAllWithTemplatesForDatacenter(CFMENavigateStep):
     prerequisite = NavigateToSibling('All')
 
     def step(self, *args, **kwargs):
+        _invalidate_match_page()
         if ('provider' in kwargs or self.obj.provider) and \
            ('datacenter_name' in kwargs or self.obj.datacenter):
             # todo: to obtain datacenter from db (ems_folders)
@@ -1015,6 +1329,7 @@ class VmAllWithTemplatesOrphaned(CFMENavigateStep):
     prerequisite = NavigateToSibling('All')
 
     def step(self, *args, **kwargs):
+        _invalidate_match_page()
         accordion.tree('VMs & Templates', 'All VMs & Templates', '<Orphaned>')
 
     def resetter(self, *args, **kwargs):
@@ -1030,6 +1345,7 @@ class VmAllWithTemplatesArchived(CFMENavigateStep):
     prerequisite = NavigateToSibling('All')
 
     def step(self, *args, **kwargs):
+        _invalidate_match_page()
         accordion.tree('VMs & Templates', 'All VMs & Templates', '<Archived>')
 
     def resetter(self, *args, **kwargs):
@@ -1046,6 +1362,7 @@ class VmAllWithTemplatesDetails(CFMENavigateStep):
     prerequisite = NavigateToSibling('All')
 
     def step(self, *args, **kwargs):
+        _invalidate_match_page()
         sel.click(self.obj.find_quadicon(do_not_navigate=True))
 
     def am_i_here(self, *args, **kwargs):
@@ -1057,6 +1374,7 @@ class VmAll(CFMENavigateStep):
     prerequisite = NavigateToSibling('All')
 
     def step(self, *args, **kwargs):
+        _invalidate_match_page()
         vms = partial(accordion.tree, 'VMs', 'All VMs')
         if 'filter_folder' not in kwargs:
             vms()
@@ -1081,6 +1399,7 @@ class VmDetails(CFMENavigateStep):
     prerequisite = NavigateToSibling('VMsOnly')
 
     def step(self, *args, **kwargs):
+        _invalidate_match_page()
         sel.click(self.obj.find_quadicon(do_not_navigate=True))
 
     def am_i_here(self, *args, **kwargs):
@@ -1092,6 +1411,7 @@ class VmMigrate(CFMENavigateStep):
     prerequisite = NavigateToSibling('VMsOnlyDetails')
 
     def step(self, *args, **kwargs):
+        _invalidate_match_page()
         lcl_btn("Migrate this VM")
 
     def am_i_here(self, *args, **kwargs):
@@ -1103,6 +1423,7 @@ class VmClone(CFMENavigateStep):
     prerequisite = NavigateToSibling('VMsOnlyDetails')
 
     def step(self, *args, **kwargs):
+        _invalidate_match_page()
         lcl_btn("Clone this VM")
 
     def am_i_here(self, *args, **kwargs):
@@ -1114,6 +1435,7 @@ class TemplatesAll(CFMENavigateStep):
     prerequisite = NavigateToAttribute('appliance.server', 'LoggedIn')
 
     def step(self, *args, **kwargs):
+        _invalidate_match_page()
         self.prerequisite_view.navigation.select('Compute', 'Infrastructure', '/vm_infra/explorer')
         templates = partial(accordion.tree, 'Templates', 'All Templates')
         if 'filter_folder' not in kwargs:
@@ -1130,19 +1452,56 @@ class TemplatesAll(CFMENavigateStep):
         return match_page(summary='Template "{}"'.format(self.obj.name))
 
 
+# Finds the index of the template row matching (name, provider) in one browser
+# round-trip; find_row_by_cells reads every cell of every row individually.
+_TEMPLATE_ROW_JS = """
+var table = document.querySelector('#pre_prov_div table');
+if (table === null) { return null; }
+var headers = table.querySelectorAll('th');
+var nameIdx = -1, provIdx = -1;
+for (var i = 0; i < headers.length; i++) {
+    var label = headers[i].textContent.trim();
+    if (label === 'Name') { nameIdx = i; }
+    else if (label === 'Provider') { provIdx = i; }
+}
+if (nameIdx < 0 || provIdx < 0) { return null; }
+var rows = table.querySelectorAll('tbody tr');
+for (var r = 0; r < rows.length; r++) {
+    var cells = rows[r].cells;
+    if (cells.length <= nameIdx || cells.length <= provIdx) { continue; }
+    if (cells[nameIdx].textContent.trim() === arguments[0] &&
+            cells[provIdx].textContent.trim() === arguments[1]) {
+        return r + 1;
+    }
+}
+return null;
+"""
+
+
 @navigator.register(Vm, 'ProvisionVM')
 class ProvisionVM(CFMENavigateStep):
     prerequisite = NavigateToSibling('All')
 
     def step(self, *args, **kwargs):
+        _invalidate_match_page()
         lcl_btn("Provision VMs")
 
         # choosing template and going further
-        template_select_form.template_table._update_cache()
-        template = template_select_form.template_table.find_row_by_cells({
-            'Name': self.obj.template_name,
-            'Provider': self.obj.provider.name
-        })
+        try:
+            row_idx = sel.execute_script(
+                _TEMPLATE_ROW_JS, self.obj.template_name, self.obj.provider.name)
+        except WebDriverException:
+            row_idx = None
+        if row_idx is not None:
+            template = sel.element(
+                '//div[@id="pre_prov_div"]//table/tbody/tr[{}]'.format(row_idx))
+        else:
+            # scripted lookup missed; fall back to the cell-by-cell scan
+            template_select_form.template_table._update_cache()
+            template = template_select_form.template_table.find_row_by_cells({
+                'Name': self.obj.template_name,
+                'Provider': self.obj.provider.name
+            })
         if template:
             sel.click(template)
             # In order to mitigate the sometimes very long spinner timeout, raise the timeout
@@ -1160,6 +1519,7 @@ class Timelines(CFMENavigateStep):
     prerequisite = NavigateToSibling('Details')
 
     def step(self):
+        _invalidate_match_page()
         mon_btn('Timelines')
 
 
@@ -1169,6 +1529,7 @@ class VmReconfigure(CFMENavigateStep):
     prerequisite = NavigateToSibling('Details')
 
     def step(self):
+        _invalidate_match_page()
         self.prerequisite_view.configuration.item_select('Reconfigure this VM')
 
 
@@ -1178,4 +1539,5 @@ class VmEngineRelationship(CFMENavigateStep):
     prerequisite = NavigateToSibling('Details')
 
     def step(self):
+        _invalidate_match_page()
         self.prerequisite_view.configuration.item_select('Edit Management Engine Relationship')
@@ -1,3 +1,5 @@
+from functools import partial
+
 import pytest
 
 from cfme.common.vm import VM
@@ -16,6 +18,13 @@ pytestmark = [
     pytest.mark.usefixtures('setup_provider'), pytest.mark.long_running, pytest.mark.tier(2)]
 
 
+def _refresh(vm):
+    # Drop the cached VMConfiguration along with the relationships refresh,
+    # otherwise every retry would compare the same stale snapshot
+    vm.refresh_relationships()
+    vm.refresh_configuration()
+
+
 @pytest.yield_fixture(scope='module')
 def small_vm(provider, small_template_modscope):
     vm = VM.factory(random_vm_name(context='reconfig'), provider, small_template_modscope)
@@ -62,13 +71,13 @@ def test_vm_reconfig_add_remove_hw_cold(
     small_vm.reconfigure(new_config)
     wait_for(
         lambda: small_vm.configuration == new_config, timeout=360, delay=45,
-        fail_func=small_vm.refresh_relationships,
+        fail_func=partial(_refresh, small_vm),
         message="confirm that {} was added".format(change_type))
 
     small_vm.reconfigure(orig_config)
     wait_for(
         lambda: small_vm.configuration == orig_config, timeout=360, delay=45,
-        fail_func=small_vm.refresh_relationships,
+        fail_func=partial(_refresh, small_vm),
         message="confirm that previously-added {} was removed".format(change_type))
 
 
@@ -87,11 +96,11 @@ def test_vm_reconfig_add_remove_disk_cold(
     small_vm.reconfigure(new_config)
     wait_for(
         lambda: small_vm.configuration == new_config, timeout=360, delay=45,
-        fail_func=small_vm.refresh_relationships,
+        fail_func=partial(_refresh, small_vm),
         message="confirm that disk was added")
 
     small_vm.reconfigure(orig_config)
     wait_for(
         lambda: small_vm.configuration == orig_config, timeout=360, delay=45,
-        fail_func=small_vm.refresh_relationships,
+        fail_func=partial(_refresh, small_vm),
         message="confirm that previously-added disk was removed")
@@ -77,16 +77,33 @@ def last():
     return btn
 
 
+def _results_select():
+    return version.pick({
+        version.LOWEST: Select(_locator() + _num_results),
+        "5.5": AngularSelect('ppsetting')})
+
+
+def results_per_page_current():
+    """ Returns the currently selected results-per-page setting as text."""
+    try:
+        return _results_select().first_selected_option_text
+    except NoSuchElementException:
+        return None
+
+
 def results_per_page(num):
     """ Changes the number of results on a page.
 
+    Selecting a value triggers a full page reload in CFME, so this is a no-op
+    when the setting already matches.
+
     Args:
         num: Number of results per page
     """
-    _select = version.pick({
-        version.LOWEST: Select(_locator() + _num_results),
-        "5.5": AngularSelect('ppsetting')})
-    sel.select(_select, sel.ByText(str(num)))
+    num = str(num)
+    if results_per_page_current() == num:
+        return
+    sel.select(_results_select(), sel.ByText(num))
 
 
 def sort_by(sort):
@@ -34,7 +34,6 @@ from itertools import groupby
 
 
 import difflib
-import json
 import os
 import signal
 import subprocess
@@ -43,6 +42,7 @@ from datetime import datetime
 from itertools import count
 
 import attr
+import msgpack
 
 from threading import Thread
 from time import sleep, time
@@ -247,11 +247,12 @@ class ParallelSession(object):
     def send(self, slave, event_data):
         """Send data to slave.
 
-        ``event_data`` will be serialized as JSON, and so must be JSON serializable
+        ``event_data`` is serialized with msgpack, and so must be built from
+        msgpack-friendly primitives
 
         """
-        event_json = json.dumps(event_data)
-        self.sock.send_multipart([slave.id, '', event_json])
+        event_packed = msgpack.packb(event_data)
+        self.sock.send_multipart([slave.id, '', event_packed])
 
     def recv(self):
         # poll the zmq socket, populate the recv queue deque with responses
@@ -259,8 +260,8 @@ class ParallelSession(object):
         events = zmq.zmq_poll([(self.sock, zmq.POLLIN)], 50)
         if not events:
             return None, None, None
-        slaveid, _, event_json = self.sock.recv_multipart(flags=zmq.NOBLOCK)
-        event_data = json.loads(event_json)
+        slaveid, _, event_packed = self.sock.recv_multipart(flags=zmq.NOBLOCK)
+        event_data = msgpack.unpackb(event_packed, encoding='utf-8')
         event_name = event_data.pop('_event_name')
         if slaveid not in self.slaves:
             self.log.error("message from terminated worker %s %s %s",
@@ -291,6 +292,32 @@ class ParallelSession(object):
         """Acknowledge a slave's message"""
         self.send(slave, 'ack {}'.format(event_name))
 
+    def handle_notification(self, slave, event_data, event_name):
+        """Handle a fire-and-forget slave event
+
+        These are sent without waiting for a reply, either individually or
+        coalesced inside a ``batch`` event, and are never acked.
+
+        """
+        if event_name == 'message':
+            message = event_data.pop('message')
+            markup = event_data.pop('markup')
+            # messages are special, handle them immediately
+            self.print_message(message, slave, **markup)
+        elif event_name == 'runtest_logstart':
+            self.trdist.runtest_logstart(
+                slave.id,
+                event_data['nodeid'],
+                event_data['location'])
+        elif event_name == 'runtest_logreport':
+            report = unserialize_report(event_data['report'])
+            if report.when in ('call', 'teardown'):
+                slave.tests.discard(report.nodeid)
+            self.trdist.runtest_logreport(slave.id, report)
+        elif event_name == 'internalerror':
+            self.print_message(event_data['message'], slave, purple=True)
+            self.kill(slave)
+
     def monitor_shutdown(self, slave):
         # non-daemon so slaves get every opportunity to shut down cleanly
         shutdown_thread = Thread(target=self._monitor_shutdown_t,
@@ -430,12 +457,15 @@ class ParallelSession(object):
                     break
 
                 slave, event_data, event_name = self.recv()
-                if event_name == 'message':
-                    message = event_data.pop('message')
-                    markup = event_data.pop('markup')
-                    # messages are special, handle them immediately
-                    self.print_message(message, slave, **markup)
-                    self.ack(slave, event_name)
+                # notifications and batches are fire-and-forget on the slave
+                # side, so they must not be acked
+                if event_name in ('message', 'runtest_logstart',
+                                  'runtest_logreport', 'internalerror'):
+                    self.handle_notification(slave, event_data, event_name)
+                elif event_name == 'batch':
+                    for event in event_data['events']:
+                        self.handle_notification(slave, event,
+                                                 event.pop('_event_name'))
                 elif event_name == 'collectionfinish':
                     slave_collection = event_data['node_ids']
                     # compare slave collection to the master, all test ids must be the same
@@ -455,22 +485,6 @@ class ParallelSession(object):
                 elif event_name == 'need_tests':
                     self.send_tests(slave)
                     self.log.info('starting master test distribution')
-                elif event_name == 'runtest_logstart':
-                    self.ack(slave, event_name)
-                    self.trdist.runtest_logstart(
-                        slave.id,
-                        event_data['nodeid'],
-                        event_data['location'])
-                elif event_name == 'runtest_logreport':
-                    self.ack(slave, event_name)
-                    report = unserialize_report(event_data['report'])
-                    if report.when in ('call', 'teardown'):
-                        slave.tests.discard(report.nodeid)
-                    self.trdist.runtest_logreport(slave.id, report)
-                elif event_name == 'internalerror':
-                    self.ack(slave, event_name)
-                    self.print_message(event_data['message'], slave, purple=True)
-                    self.kill(slave)
                 elif event_name == 'shutdown':
                     self.config.hook.pytest_miq_node_shutdown(
                         config=self.config, nodeinfo=slave.appliance.url)
@@ -1,10 +1,20 @@
 import signal
+import time
 
+import msgpack
+import pytest  # NOQA
 import zmq
+from _pytest.config import get_config
 from py.path import local
+from six.moves import intern
 
 SLAVEID = None
 
+# Coalesce fire-and-forget events into one round-trip; flush when the batch
+# grows to this many events or has been sitting for this long.
+BATCH_SIZE = 32
+BATCH_WINDOW = 0.01
+
 
 class SlaveManager(object):
     """SlaveManager which coordinates with the master process for parallel testing"""
@@ -18,9 +28,17 @@ class SlaveManager(object):
         conf.clear()
         # Override the logger in utils.log
 
-        ctx = zmq.Context.instance()
-        self.sock = ctx.socket(zmq.REQ)
-        self.sock.set_hwm(1)
+        # two io threads so the background encoder keeps up with logreport bursts
+        ctx = zmq.Context.instance(io_threads=2)
+        # DEALER instead of REQ: REQ enforces a strict send/recv lockstep,
+        # which costs a full round-trip even for events the master only acks.
+        # DEALER lets us fire those off without waiting; the empty delimiter
+        # frame is added by hand to keep the master's ROUTER framing intact.
+        self.sock = ctx.socket(zmq.DEALER)
+        # enough queue to pipeline bursts of batched events; a bounded send
+        # timeout turns a wedged master into a visible error instead of a hang
+        self.sock.set_hwm(256)
+        self.sock.setsockopt(zmq.SNDTIMEO, 5000)
         self.sock.setsockopt_string(zmq.IDENTITY, u'{}'.format(self.slaveid))
         self.sock.connect(zmq_endpoint)
 
@@ -28,11 +46,39 @@ class SlaveManager(object):
 
         self.quit_signaled = False
 
-    def send_event(self, name, **kwargs):
+        self._pending = []
+        self._last_flush = time.time()
+        # True while a prefetched need_tests request is awaiting its reply
+        self._tests_outstanding = False
+
+    def _enqueue(self, name, **kwargs):
+        """Queue up a fire-and-forget event, flushing the batch when it fills up
+
+        logstart/logreport happen for every test, so shipping them one
+        synchronous round-trip at a time dominates per-test overhead; batching
+        them trades a few ms of latency for ~BATCH_SIZE fewer round-trips.
+        """
+        kwargs['_event_name'] = name
+        self._pending.append(kwargs)
+        if (len(self._pending) >= BATCH_SIZE or
+                time.time() - self._last_flush > BATCH_WINDOW):
+            self._flush()
+
+    def _flush(self):
+        """Send any queued events to the master as a single batch"""
+        if self._pending:
+            pending, self._pending = self._pending, []
+            self.send_event_async('batch', events=pending)
+        self._last_flush = time.time()
+
+    def send_event_async(self, name, **kwargs):
+        """Send an event the master doesn't reply to, without waiting"""
         kwargs['_event_name'] = name
         self.log.trace("sending {} {!r}".format(name, kwargs))
-        self.sock.send_json(kwargs)
-        recv = self.sock.recv_json()
+        self.sock.send_multipart(['', msgpack.packb(kwargs)])
+
+    def _recv_reply(self):
+        recv = msgpack.unpackb(self.sock.recv_multipart()[-1], encoding='utf-8')
         if recv == 'die':
             self.log.info('Slave instructed to die by master; shutting down')
             raise SystemExit()
@@ -41,9 +87,13 @@ class SlaveManager(object):
             if recv != 'ack':
                 return recv
 
+    def send_event(self, name, **kwargs):
+        self.send_event_async(name, **kwargs)
+        return self._recv_reply()
+
     def message(self, message, **kwargs):
         """Send a message to the master, which should get printed to the console"""
-        self.send_event('message', message=message, markup=kwargs)  # message!
+        self.send_event_async('message', message=message, markup=kwargs)  # message!
 
     def pytest_collection_finish(self, session):
         """pytest collection hook
@@ -55,7 +105,7 @@ class SlaveManager(object):
         self.session = session
         self.collection = {item.nodeid: item for item in session.items}
         terminalreporter.disable()
-        self.send_event("collectionfinish", node_ids=self.collection.keys())
+        self.send_event("collectionfinish", node_ids=list(self.collection))
 
     def pytest_runtest_logstart(self, nodeid, location):
         """pytest runtest logstart hook
@@ -63,7 +113,7 @@ class SlaveManager(object):
         - sends logstart notice to the master
 
         """
-        self.send_event("runtest_logstart", nodeid=nodeid, location=location)
+        self._enqueue("runtest_logstart", nodeid=nodeid, location=location)
 
     def pytest_runtest_logreport(self, report):
         """pytest runtest logreport hook
@@ -71,7 +121,7 @@ class SlaveManager(object):
         - sends serialized log reports to the master
 
         """
-        self.send_event("runtest_logreport", report=serialize_report(report))
+        self._enqueue("runtest_logreport", report=serialize_report(report))
 
     def pytest_internalerror(self, excrepr):
         """pytest internal error hook
@@ -84,7 +134,7 @@ class SlaveManager(object):
         self.log.error(msg)
         # Only send the last line (exc type/message) to keep the pytest log clean
         short_tb = 'INTERNALERROR> {}'.format(msg.strip().splitlines()[-1])
-        self.send_event("internalerror", message=short_tb)
+        self.send_event_async("internalerror", message=short_tb)
 
     def pytest_runtestloop(self, session):
         """pytest runtest loop
@@ -112,6 +162,12 @@ class SlaveManager(object):
 
     def shutdown(self):
         self.message('shutting down')
+        self._flush()
+        if self._tests_outstanding:
+            # quitting mid-batch leaves a prefetched need_tests reply queued;
+            # drain it so the shutdown ack isn't misread
+            self._recv_reply()
+            self._tests_outstanding = False
         self.send_event('shutdown')
         self.quit_signaled = True
 
@@ -124,30 +180,46 @@ class SlaveManager(object):
             run_node = next_node
         yield run_node, None
 
+    def _request_tests(self):
+        # fire the request without waiting for the reply, which is collected
+        # once the current batch runs out; the master round-trip and test
+        # selection then overlap with test execution instead of stalling it
+        self._flush()
+        self.send_event_async('need_tests')
+        self._tests_outstanding = True
+
     def _iter_nodes(self):
+        self._request_tests()
         while True:
-            node_ids = self.send_event('need_tests')
+            node_ids = self._recv_reply()
+            self._tests_outstanding = False
             if not node_ids:
                 break
-            for nodeid in node_ids:
-                # TODO: take non-unique node ids into account
-                yield self.collection[nodeid]
+            self._request_tests()
+            # intern the decoded ids so the collection lookups compare
+            # pointers, and resolve the whole batch up front
+            # TODO: take non-unique node ids into account
+            items = [self.collection[intern(str(nodeid))] for nodeid in node_ids]
+            for item in items:
+                yield item
 
 
 def serialize_report(rep):
     """
     Get a :py:class:`TestReport <pytest:_pytest.runner.TestReport>` ready to send to the master
     """
-    d = rep.__dict__.copy()
+    d = {}
+    for name, value in rep.__dict__.items():
+        if name == "result":
+            d[name] = None
+        elif isinstance(value, local):
+            d[name] = str(value)
+        else:
+            d[name] = value
     if hasattr(rep.longrepr, 'toterminal'):
         d['longrepr'] = str(rep.longrepr)
     else:
         d['longrepr'] = rep.longrepr
-    for name in d:
-        if isinstance(d[name], local):
-            d[name] = str(d[name])
-        elif name == "result":
-            d[name] = None
     return d
 
 
@@ -156,8 +228,6 @@ def _init_config(slave_options, slave_args):
     # This is a slightly modified form of _pytest.config.Config.fromdictargs
     # yaml is able to pack up the entire CmdOptions call from pytest, so
     # we can just set config.option to what was passed from the master in the slave_config yaml
-    import pytest  # NOQA
-    from _pytest.config import get_config
     config = get_config()
     config.args = slave_args
     config._preparse(config.args, addopts=False)